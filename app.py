@@ -1,73 +1,39 @@
-import datetime
-from openai import OpenAI
+from openai.types.responses import ResponseTextDeltaEvent
 import asyncio
-from agents import Agent, Runner, function_tool, trace
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
+import signal
+from agents import Agent, ModelSettings, Runner, function_tool, trace
 from dotenv import load_dotenv
-import os.path
-import pickle
-from typing import List, Optional
+import threading
+from typing import Optional
 from datetime import datetime, timezone
-import calendar
 import logging
 
+from calendar_service import (
+    BLOCKING_EXECUTOR,
+    CalendarEventRequest,
+    build_event_body,
+    call_google_api,
+    create_event,
+    create_events_batch,
+    list_events,
+    month_range,
+    normalize_events,
+    warm_up,
+)
+from quick_schedule import quick_schedule
+
 # Load environment variables
 load_dotenv()
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-# Google Calendar API setup
-SCOPES = ['https://www.googleapis.com/auth/calendar']
+# Most recent messages (user + assistant) sent to the model each turn
+MAX_HISTORY_MESSAGES = 40
 
 # Logger setup
 logger = logging.getLogger(__name__)
 
-def get_calendar_service():
-    """Authenticate and return Google Calendar service."""
-    creds = None
-    if os.path.exists('token.pickle'):
-        with open('token.pickle', 'rb') as token:
-            creds = pickle.load(token)
-    
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            flow = InstalledAppFlow.from_client_secrets_file(
-                'credentials.json', SCOPES)
-            creds = flow.run_local_server(port=0)
-        
-        with open('token.pickle', 'wb') as token:
-            pickle.dump(creds, token)
-    
-    return build('calendar', 'v3', credentials=creds)
-
-def create_event(summary: str, start_iso: str, end_iso: str, attendees: list[str] | None = None) -> str:
-    """Create a Google Calendar event and return the event link."""
-    service = get_calendar_service()
-    
-    event = {
-        'summary': summary,
-        'start': {
-            'dateTime': start_iso,
-            'timeZone': 'UTC',
-        },
-        'end': {
-            'dateTime': end_iso,
-            'timeZone': 'UTC',
-        },
-    }
-    
-    if attendees:
-        event['attendees'] = [{'email': email} for email in attendees]
-    
-    created_event = service.events().insert(calendarId='primary', body=event).execute()
-    return created_event.get('htmlLink', 'Event created successfully')
 
 @function_tool
-def schedule_calendar_event(
+async def schedule_calendar_event(
     title: str,
     start_time: str,
     end_time: str,
@@ -80,18 +46,34 @@ def schedule_calendar_event(
     print(f"   End: {end_time}")
     print(f"   Attendees: {attendees or 'None'}")
     
-    link = create_event(
-        summary=title,
-        start_iso=start_time,
-        end_iso=end_time,
-        attendees=attendees,
+    link = await call_google_api(
+        create_event,
+        build_event_body(title, start_time, end_time, attendees),
     )
     
     print(f"   ✅ Event created: {link}\n")
     return {"event_link": link}
 
 @function_tool
-def list_calendar_meetings(
+async def schedule_calendar_events_batch(events: list[CalendarEventRequest]) -> dict:
+    """Schedule several calendar events at once with a single batch request."""
+    print("\n🔧 Tool Called: schedule_calendar_events_batch")
+    print(f"   Events: {len(events)}")
+
+    bodies = [
+        build_event_body(e.title, e.start_time, e.end_time, e.attendees)
+        for e in events
+    ]
+    results = await call_google_api(create_events_batch, bodies)
+
+    for event, result in zip(events, results):
+        result["title"] = event.title
+        print(f"   {'❌' if 'error' in result else '✅'} {event.title}: {result.get('event_link') or result.get('error')}")
+    print()
+    return {"count": len(results), "results": results}
+
+@function_tool
+async def list_calendar_meetings(
     period: Optional[str] = "current_month",
     start_iso: Optional[str] = None,
     end_iso: Optional[str] = None,
@@ -109,61 +91,15 @@ def list_calendar_meetings(
         if not start_iso and not end_iso:
             if period == "current_month":
                 now = datetime.now(timezone.utc)
-                year = now.year
-                month = now.month
-                first_day = datetime(year, month, 1, 0, 0, 0, tzinfo=timezone.utc)
-                last_day_num = calendar.monthrange(year, month)[1]
-                last_day = datetime(year, month, last_day_num, 23, 59, 59, tzinfo=timezone.utc)
-                start_iso = first_day.isoformat()
-                end_iso = last_day.isoformat()
+                start_iso, end_iso = month_range(now.year, now.month)
             else:
                 raise ValueError("Either provide start_iso/end_iso or use period='current_month'")
 
-        logger.info(f"Listing events from {start_iso} to {end_iso}")
-
-        service = get_calendar_service()
-
-        events_result = (
-            service.events()
-            .list(
-                calendarId="primary",
-                timeMin=start_iso,
-                timeMax=end_iso,
-                singleEvents=True,
-                orderBy="startTime",
-                maxResults=max_results,
-            )
-            .execute()
-        )
+        logger.info("Listing events from %s to %s", start_iso, end_iso)
+
+        events_result = await call_google_api(list_events, start_iso, end_iso, max_results)
 
-        items = events_result.get("items", [])
-        events: List[dict] = []
-
-        for ev in items:
-            start = ev.get("start", {})
-            end = ev.get("end", {})
-
-            # support both dateTime (timed events) and date (all-day)
-            start_val = start.get("dateTime") or start.get("date")
-            end_val = end.get("dateTime") or end.get("date")
-
-            attendees = []
-            for a in ev.get("attendees", []):
-                attendees.append({
-                    "email": a.get("email"),
-                    "responseStatus": a.get("responseStatus")
-                })
-
-            events.append({
-                "id": ev.get("id"),
-                "summary": ev.get("summary"),
-                "start": start_val,
-                "end": end_val,
-                "attendees": attendees,
-                "htmlLink": ev.get("htmlLink"),
-                "created": ev.get("created"),
-                "updated": ev.get("updated"),
-            })
+        events = normalize_events(events_result.get("items", []))
 
         return {"count": len(events), "events": events}
 
@@ -171,20 +107,14 @@ def list_calendar_meetings(
         logger.exception("Failed to list calendar meetings")
         return {"error": str(e), "count": 0, "events": []}
 
-def create_calendar_agent():
-    """Create and return the calendar agent with configured tools and instructions."""
-    current_datetime = datetime.now()
-    current_date_str = current_datetime.strftime("%A, %B %d, %Y")
-    current_time_str = current_datetime.strftime("%I:%M %p")
-
-    return Agent(
-        name="Calendar Agent",
-        instructions="""
+# Static parts of the instructions, joined around the date and time on each run
+_INSTRUCTIONS_PREFIX = """
 You are a scheduling agent.
 
 IMPORTANT CONTEXT:
-- Today is: {current_date_str}
-- Current time is: {current_time_str}
+- Today is: """
+_INSTRUCTIONS_MID = "\n- Current time is: "
+_INSTRUCTIONS_SUFFIX = """
 - Use this information to understand relative dates like "tomorrow", "next week", "today", etc.
 
 Behavior rules:
@@ -194,20 +124,111 @@ Behavior rules:
 - Never create an event until you have:
   title, start_time, end_time (in ISO 8601 format: YYYY-MM-DDTHH:MM:SS)
 - Once ready, call the calendar tool
+- When two or more events are ready to be created, use schedule_calendar_events_batch instead of calling schedule_calendar_event repeatedly
 - You can also list meetings in a time range using list_calendar_meetings
 - When listing meetings, default to current month if no range is specified
 - Confirm the result
-""",
+"""
+
+
+def calendar_agent_instructions(context, agent) -> str:
+    """Render the agent instructions with the current date and time."""
+    # Get current date and time for context
+    current_datetime = datetime.now()
+    current_date_str = current_datetime.strftime("%A, %B %d, %Y")
+    current_time_str = current_datetime.strftime("%I:%M %p")
+
+    return "".join((_INSTRUCTIONS_PREFIX, current_date_str, _INSTRUCTIONS_MID, current_time_str, _INSTRUCTIONS_SUFFIX))
+
+def create_calendar_agent():
+    """Create and return the calendar agent with configured tools and instructions."""
+    # Instructions are rendered per run, so one agent can be reused across turns
+    return Agent(
+        name="Calendar Agent",
+        instructions=calendar_agent_instructions,
         tools=[
             schedule_calendar_event,
+            schedule_calendar_events_batch,
             list_calendar_meetings
         ],
         model="gpt-4o-mini",
+        # Independent tool calls from one response are executed concurrently
+        model_settings=ModelSettings(parallel_tool_calls=True),
     )
 
 
-def main():
+async def ainput(prompt: str) -> str:
+    """Read a line from stdin on a daemon thread without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def deliver(setter, value):
+        if not future.done():
+            setter(value)
+
+    def read_line():
+        try:
+            line = input(prompt)
+        except BaseException as e:
+            loop.call_soon_threadsafe(deliver, future.set_exception, e)
+        else:
+            loop.call_soon_threadsafe(deliver, future.set_result, line)
+
+    # A daemon thread (not the executor) so a pending read never delays exit
+    threading.Thread(target=read_line, daemon=True).start()
+    return await future
+
+
+async def stream_turn(calendar_agent, messages) -> str:
+    """Run one agent turn, printing the reply as it streams, and return the final output."""
+    with trace("Calendar Agent Execution"):
+        result = Runner.run_streamed(
+            starting_agent=calendar_agent,
+            input=messages
+        )
+        printed = False
+        try:
+            async for event in result.stream_events():
+                if event.type == "raw_response_event" and isinstance(event.data, ResponseTextDeltaEvent):
+                    if not printed:
+                        print("Agent: ", end="", flush=True)
+                        printed = True
+                    print(event.data.delta, end="", flush=True)
+        finally:
+            if not result.is_complete:
+                result.cancel()
+            print()
+    return result.final_output
+
+
+async def run_cancellable_turn(calendar_agent, messages) -> str | None:
+    """Stream one agent turn; Ctrl-C cancels it (not on Windows) and returns None."""
+    loop = asyncio.get_running_loop()
+    turn = asyncio.create_task(stream_turn(calendar_agent, messages))
+
+    try:
+        loop.add_signal_handler(signal.SIGINT, turn.cancel)
+    except (NotImplementedError, RuntimeError):
+        pass
+    try:
+        return await turn
+    except asyncio.CancelledError:
+        if not turn.cancelled():
+            raise
+        return None
+    finally:
+        try:
+            loop.remove_signal_handler(signal.SIGINT)
+        except (NotImplementedError, RuntimeError):
+            pass
+
+
+async def main():
     """Main function to run the calendar agent in an interactive loop."""
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(BLOCKING_EXECUTOR)
+    # Authenticate while the user types the first message
+    loop.run_in_executor(None, warm_up)
     calendar_agent = create_calendar_agent()
     conversation_history = []
     
@@ -216,7 +237,10 @@ def main():
     print("Type 'exit' or 'quit' to end the conversation.\n")
     
     while True:
-        user_input = input("User: ")
+        try:
+            user_input = await ainput("User: ")
+        except EOFError:
+            user_input = "exit"
         if user_input.lower() in {"exit", "quit"}:
             print("Goodbye!")
             break
@@ -224,22 +248,26 @@ def main():
         # Add user message to history
         conversation_history.append({"role": "user", "content": user_input})
         
-        # Create context from history
-        context = "\n".join([f"{msg['role']}: {msg['content']}" for msg in conversation_history])
-        
-        # Run with trace context
-        with trace("Calendar Agent Execution"):
-            result = Runner.run_sync(
-                starting_agent=calendar_agent,
-                input=context
-            )
-
-        response = result.final_output
-        print("Agent:", response)
+        # Fully specified requests are scheduled directly, without a model round-trip
+        response = await quick_schedule(user_input)
+        if response is not None:
+            print("Agent:", response)
+        else:
+            # Pass the message list so the SDK can send it as chat history and
+            # the stable prefix stays cacheable
+            response = await run_cancellable_turn(calendar_agent, list(conversation_history))
+            if response is None:
+                print("(cancelled)")
+                conversation_history.pop()
+                continue
         
-        # Add agent response to history
+        # Add agent response to history and keep only the recent window
         conversation_history.append({"role": "assistant", "content": response})
+        del conversation_history[:-MAX_HISTORY_MESSAGES]
 
 
 if __name__ == "__main__":
-    main()
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        print("\nGoodbye!")
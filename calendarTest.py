@@ -1,37 +1,9 @@
 """
 Test script to verify Google Calendar API setup and authentication.
 """
-import os.path
-import pickle
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
 from datetime import datetime
 
-# Google Calendar API setup
-SCOPES = ['https://www.googleapis.com/auth/calendar']
-
-
-def get_calendar_service():
-    """Authenticate and return Google Calendar service."""
-    creds = None
-    if os.path.exists('token.pickle'):
-        with open('token.pickle', 'rb') as token:
-            creds = pickle.load(token)
-    
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            flow = InstalledAppFlow.from_client_secrets_file(
-                'credentials.json', SCOPES)
-            creds = flow.run_local_server(port=0)
-        
-        with open('token.pickle', 'wb') as token:
-            pickle.dump(creds, token)
-    
-    return build('calendar', 'v3', credentials=creds)
+from calendar_service import get_service
 
 
 def test_calendar_service():
@@ -43,7 +15,7 @@ def test_calendar_service():
     try:
         # Test authentication
         print("\n1. Testing authentication...")
-        service = get_calendar_service()
+        service = get_service()
         print("   ✓ Authentication successful!")
         
         # Test API access by getting calendar list
@@ -0,0 +1,402 @@
+"""
+Shared Google Calendar access for the CLI, the Flask app and the test script.
+
+Owns the process-wide credentials, service and HTTP session caches so every
+entrypoint authenticates and builds the client exactly once.
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+import calendar
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import List
+
+import requests
+from requests.adapters import HTTPAdapter
+from google.oauth2.credentials import Credentials
+from google.auth.transport.requests import AuthorizedSession, Request
+from pydantic import BaseModel
+
+# googleapiclient, google_auth_oauthlib and google_auth_httplib2 pull in large
+# import graphs but are only needed for the OAuth flow, the discovery service
+# and batch requests, so they are imported where used rather than at startup.
+
+logger = logging.getLogger(__name__)
+
+# Google Calendar API setup
+SCOPES = ['https://www.googleapis.com/auth/calendar']
+TOKEN_FILE = 'token.json'
+CALENDAR_EVENTS_URL = 'https://www.googleapis.com/calendar/v3/calendars/primary/events'
+EVENT_TIME_ZONE = 'UTC'
+
+
+# Process-wide cache so tool calls reuse one authenticated service
+_SERVICE_CACHE = {"creds": None, "service": None, "service_creds": None, "http_session": None}
+_SERVICE_LOCK = threading.Lock()
+
+# Refresh this long before expiry so a slow request never carries a stale token
+TOKEN_REFRESH_LEEWAY = timedelta(minutes=5)
+
+
+def needs_refresh(creds) -> bool:
+    """Return True when credentials are invalid, or refreshable and expiring within TOKEN_REFRESH_LEEWAY.
+
+    Without a refresh token only the interactive OAuth flow can replace them,
+    so such credentials are used until they actually expire.
+    """
+    if not creds.valid:
+        return True
+    if not creds.refresh_token:
+        return False
+    # google-auth keeps expiry as a naive UTC datetime
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    return creds.expiry is not None and creds.expiry - now < TOKEN_REFRESH_LEEWAY
+
+
+def save_credentials(creds) -> None:
+    """Write credentials to TOKEN_FILE atomically, so a crash never leaves it half-written."""
+    data = creds.to_json()
+    tmp_path = f"{TOKEN_FILE}.tmp"
+    with open(tmp_path, 'w') as token:
+        token.write(data)
+    try:
+        os.replace(tmp_path, TOKEN_FILE)
+    except OSError:
+        # A file bind-mounted into a container cannot be replaced, only rewritten
+        os.remove(tmp_path)
+        with open(TOKEN_FILE, 'w') as token:
+            token.write(data)
+
+
+def _get_credentials():
+    """Load, refresh and persist the cached credentials; the caller holds _SERVICE_LOCK."""
+    creds = _SERVICE_CACHE["creds"]
+    if creds and not needs_refresh(creds):
+        return creds
+
+    if creds is None and os.path.exists(TOKEN_FILE):
+        with open(TOKEN_FILE) as token:
+            creds = Credentials.from_authorized_user_info(json.load(token), SCOPES)
+
+    if not creds or needs_refresh(creds):
+        if creds and creds.refresh_token:
+            creds.refresh(Request())
+        else:
+            from google_auth_oauthlib.flow import InstalledAppFlow
+
+            flow = InstalledAppFlow.from_client_secrets_file(
+                'credentials.json', SCOPES)
+            creds = flow.run_local_server(port=0)
+
+        # Only persist when the credentials actually changed
+        save_credentials(creds)
+
+    _SERVICE_CACHE["creds"] = creds
+    return creds
+
+
+def get_service():
+    """Authenticate and return the cached Google Calendar discovery service.
+
+    Only batch requests need it; single inserts and listing go through
+    get_http_session and never import googleapiclient.
+    """
+    with _SERVICE_LOCK:
+        creds = _get_credentials()
+
+        # A refresh updates creds in place, so the built service stays usable.
+        # static_discovery reads the calendar v3 document pinned inside
+        # google-api-python-client instead of fetching it over HTTPS.
+        service = _SERVICE_CACHE["service"]
+        if service is None or _SERVICE_CACHE["service_creds"] is not creds:
+            from googleapiclient.discovery import build
+
+            service = build('calendar', 'v3', credentials=creds,
+                            cache_discovery=False, static_discovery=True)
+            _SERVICE_CACHE["service"] = service
+            _SERVICE_CACHE["service_creds"] = creds
+        return service
+
+
+def get_http_session():
+    """Return a pooled, authorized HTTP session for direct Calendar REST calls."""
+    with _SERVICE_LOCK:
+        creds = _get_credentials()
+        http_session = _SERVICE_CACHE["http_session"]
+        if http_session is None or http_session.credentials is not creds:
+            # One keep-alive pool shared by every worker thread, so parallel
+            # tool calls reuse TCP/TLS connections instead of opening new ones
+            http_session = AuthorizedSession(creds)
+            http_session.mount('https://', HTTPAdapter(pool_connections=20, pool_maxsize=50))
+            _SERVICE_CACHE["http_session"] = http_session
+        return http_session
+
+
+def warm_up() -> None:
+    """Load the saved credentials and build the HTTP session ahead of the first call.
+
+    Does nothing without a usable token.json, so the interactive OAuth flow
+    is never started from here; failures are logged and left to the first
+    real call to surface.
+    """
+    if not os.path.exists(TOKEN_FILE):
+        return
+    try:
+        with open(TOKEN_FILE) as token:
+            creds = Credentials.from_authorized_user_info(json.load(token), SCOPES)
+        # Same decision _get_credentials makes before falling back to the flow
+        if creds.refresh_token or not needs_refresh(creds):
+            get_http_session()
+    except Exception:
+        logger.exception("Warming up the Google Calendar client failed")
+
+
+# Bounded pool for blocking Google API calls, used as the loop's default executor
+BLOCKING_EXECUTOR = ThreadPoolExecutor(max_workers=min(32, (os.cpu_count() or 1) + 4))
+
+# Batch requests still go through googleapiclient; httplib2 connections are
+# not thread-safe, so each worker thread gets its own
+_HTTP_LOCAL = threading.local()
+
+
+def execute_request(api_request):
+    """Execute a Google API request on the calling thread's HTTP connection."""
+    from google_auth_httplib2 import AuthorizedHttp
+    from googleapiclient.http import build_http
+
+    creds = _SERVICE_CACHE["creds"]
+    http = getattr(_HTTP_LOCAL, "http", None)
+    if http is None or http.credentials is not creds:
+        http = AuthorizedHttp(creds, http=build_http())
+        _HTTP_LOCAL.http = http
+    return api_request.execute(http=http)
+
+
+# Caps in-flight Google API calls when the model fans out parallel tool calls
+GOOGLE_API_CONCURRENCY = asyncio.Semaphore(8)
+
+# Transient failures are retried locally, which is far cheaper than letting
+# the agent spend another model round-trip re-planning around the error
+GOOGLE_API_MAX_RETRIES = 5
+GOOGLE_API_RETRY_BASE_DELAY = 0.2
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+def retry_delay(attempt: int) -> float:
+    """Return the exponential backoff, with jitter, before retry number attempt + 1."""
+    return GOOGLE_API_RETRY_BASE_DELAY * 2 ** attempt + random.random() * 0.1
+
+
+def is_retryable_error(error: Exception) -> bool:
+    """Return True for rate limits, 5xx responses and dropped connections."""
+    from googleapiclient.errors import HttpError
+
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        return error.response.status_code in RETRYABLE_STATUSES
+    if isinstance(error, HttpError):
+        return error.resp.status in RETRYABLE_STATUSES
+    return isinstance(error, (requests.ConnectionError, requests.Timeout))
+
+
+async def call_google_api(func, *args, **kwargs):
+    """Run a blocking Google API call in the executor, bounded by GOOGLE_API_CONCURRENCY.
+
+    Transient failures are retried with exponential backoff and jitter, so
+    func must be safe to run again; event inserts are, because each event
+    resource carries a client-generated id.
+    """
+    for attempt in range(GOOGLE_API_MAX_RETRIES + 1):
+        async with GOOGLE_API_CONCURRENCY:
+            try:
+                return await asyncio.to_thread(func, *args, **kwargs)
+            except Exception as e:
+                if attempt == GOOGLE_API_MAX_RETRIES or not is_retryable_error(e):
+                    raise
+                delay = retry_delay(attempt)
+                logger.warning("Google API call %s failed (%s), retrying in %.2fs", func.__name__, e, delay)
+        # Back off without holding a concurrency slot
+        await asyncio.sleep(delay)
+
+
+class CalendarEventRequest(BaseModel):
+    """A single event to create with schedule_calendar_events_batch."""
+    title: str
+    start_time: str
+    end_time: str
+    attendees: list[str] | None = None
+
+
+def build_event_body(summary: str, start_iso: str, end_iso: str, attendees: list[str] | None = None) -> dict:
+    """Build the Google Calendar event resource for an insert request.
+
+    The resource gets a client-generated id (hex digits are valid Calendar
+    ids), so retrying an insert that already reached Google answers 409
+    instead of creating a duplicate.
+    """
+    # Flat literals compile to a single constant-key map build each
+    event = {
+        'id': uuid.uuid4().hex,
+        'summary': summary,
+        'start': {'dateTime': start_iso, 'timeZone': EVENT_TIME_ZONE},
+        'end': {'dateTime': end_iso, 'timeZone': EVENT_TIME_ZONE},
+    }
+
+    # Only attach attendees when there are any, so the common case allocates no list
+    if attendees:
+        event['attendees'] = [{'email': email} for email in attendees]
+
+    return event
+
+
+def create_event(event: dict) -> str:
+    """Insert an event resource built by build_event_body and return the event link."""
+    http_session = get_http_session()
+    response = http_session.post(CALENDAR_EVENTS_URL, json=event)
+    if response.status_code == 409:
+        # An earlier attempt already created it; return the existing event's link
+        response = http_session.get(f"{CALENDAR_EVENTS_URL}/{event['id']}")
+    response.raise_for_status()
+    return response.json().get('htmlLink', 'Event created successfully')
+
+
+# Google accepts at most 50 calls in a single batch request
+BATCH_SIZE_LIMIT = 50
+
+
+def create_events_batch(events: list[dict]) -> list[dict]:
+    """Insert several event resources using batch HTTP requests and return per-event results.
+
+    Each batch of up to BATCH_SIZE_LIMIT events is retried on its own, so a
+    failure in a later batch never re-sends the earlier ones. Events that a
+    failed attempt had already created answer 409 on retry and are looked up
+    instead of being inserted twice.
+    """
+    from googleapiclient.errors import HttpError
+
+    service = get_service()
+    results: List[dict] = [{} for _ in events]
+    already_created: List[int] = []
+
+    def on_response(request_id, response, exception):
+        index = int(request_id)
+        if exception is None:
+            results[index] = {"event_link": response.get('htmlLink', 'Event created successfully')}
+        elif isinstance(exception, HttpError) and exception.resp.status == 409:
+            already_created.append(index)
+        else:
+            results[index] = {"error": str(exception)}
+
+    def execute_in_batches(indices, make_request):
+        for offset in range(0, len(indices), BATCH_SIZE_LIMIT):
+            chunk = indices[offset:offset + BATCH_SIZE_LIMIT]
+            for attempt in range(GOOGLE_API_MAX_RETRIES + 1):
+                batch = service.new_batch_http_request(callback=on_response)
+                for index in chunk:
+                    batch.add(make_request(events[index]), request_id=str(index))
+                try:
+                    execute_request(batch)
+                    break
+                except Exception as e:
+                    if attempt == GOOGLE_API_MAX_RETRIES or not is_retryable_error(e):
+                        for index in chunk:
+                            results[index] = {"error": str(e)}
+                        break
+                    delay = retry_delay(attempt)
+                    logger.warning("Calendar batch request failed (%s), retrying in %.2fs", e, delay)
+                    time.sleep(delay)
+
+    execute_in_batches(
+        list(range(len(events))),
+        lambda event: service.events().insert(calendarId='primary', body=event),
+    )
+    if already_created:
+        execute_in_batches(
+            sorted(set(already_created)),
+            lambda event: service.events().get(calendarId='primary', eventId=event['id']),
+        )
+
+    return results
+
+
+# Last events list resource per (start, end, max_results), revalidated by ETag
+MAX_CACHED_EVENT_LISTS = 64
+_EVENT_LIST_CACHE: "OrderedDict[tuple, tuple[str, dict]]" = OrderedDict()
+_EVENT_LIST_CACHE_LOCK = threading.Lock()
+
+
+def list_events(start_iso: str, end_iso: str, max_results: int) -> dict:
+    """Fetch the raw events list resource for a time range.
+
+    Repeated queries send the previous ETag in If-None-Match and reuse the
+    cached resource when Google answers 304 Not Modified.
+    """
+    key = (start_iso, end_iso, max_results)
+    with _EVENT_LIST_CACHE_LOCK:
+        cached = _EVENT_LIST_CACHE.get(key)
+
+    response = get_http_session().get(
+        CALENDAR_EVENTS_URL,
+        params={
+            "timeMin": start_iso,
+            "timeMax": end_iso,
+            "singleEvents": "true",
+            "orderBy": "startTime",
+            "maxResults": max_results,
+        },
+        headers={"If-None-Match": cached[0]} if cached else None,
+    )
+    if cached and response.status_code == 304:
+        return cached[1]
+
+    response.raise_for_status()
+    events_result = response.json()
+
+    etag = response.headers.get("ETag") or events_result.get("etag")
+    if etag:
+        with _EVENT_LIST_CACHE_LOCK:
+            _EVENT_LIST_CACHE[key] = (etag, events_result)
+            _EVENT_LIST_CACHE.move_to_end(key)
+            while len(_EVENT_LIST_CACHE) > MAX_CACHED_EVENT_LISTS:
+                _EVENT_LIST_CACHE.popitem(last=False)
+    return events_result
+
+
+def normalize_events(items: list[dict]) -> List[dict]:
+    """Reduce raw event resources to the fields the agent needs."""
+    # Timed events carry dateTime, all-day events only date; the empty tuple
+    # default avoids allocating a list for events without attendees
+    return [
+        {
+            "id": ev.get("id"),
+            "summary": ev.get("summary"),
+            "start": (start := ev.get("start") or {}).get("dateTime") or start.get("date"),
+            "end": (end := ev.get("end") or {}).get("dateTime") or end.get("date"),
+            "attendees": [
+                {"email": a.get("email"), "responseStatus": a.get("responseStatus")}
+                for a in ev.get("attendees", ())
+            ],
+            "htmlLink": ev.get("htmlLink"),
+            "created": ev.get("created"),
+            "updated": ev.get("updated"),
+        }
+        for ev in items
+    ]
+
+
+@lru_cache(maxsize=16)
+def month_range(year: int, month: int) -> tuple[str, str]:
+    """Return the ISO 8601 (UTC) start and end of the given month."""
+    # Same strings datetime.isoformat() yields for UTC, without building datetimes
+    last_day_num = calendar.monthrange(year, month)[1]
+    return (
+        f"{year:04d}-{month:02d}-01T00:00:00+00:00",
+        f"{year:04d}-{month:02d}-{last_day_num:02d}T23:59:59+00:00",
+    )
@@ -1,18 +1,38 @@
-from flask import Flask, render_template, request, jsonify, session
-from openai import OpenAI
-from agents import Agent, Runner, function_tool, trace
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
+import asyncio
+import queue
+from flask import Flask, Response, render_template, request, jsonify, session, stream_with_context
+from flask.json.provider import JSONProvider
+import orjson
+from openai.types.responses import ResponseTextDeltaEvent
+from agents import Agent, ModelSettings, Runner, function_tool, trace
 from dotenv import load_dotenv
-import os.path
-import pickle
+import os
+import threading
 import secrets
 from datetime import datetime, timezone
 import logging
-from typing import List, Optional
-import calendar
+from typing import Optional
+
+from calendar_service import (
+    BLOCKING_EXECUTOR,
+    CalendarEventRequest,
+    build_event_body,
+    call_google_api,
+    create_event,
+    create_events_batch,
+    list_events,
+    month_range,
+    normalize_events,
+    warm_up,
+)
+from history_store import create_history_store
+from quick_schedule import quick_schedule
+from response_cache import SemanticResponseCache, is_cacheable
+
+try:
+    import uvloop
+except ImportError:  # uvloop is not available on Windows
+    uvloop = None
 
 # Load environment variables
 load_dotenv()
@@ -24,84 +44,81 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-app = Flask(__name__)
-app.secret_key = secrets.token_hex(16)
 
-# OpenAI client
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+class ORJSONProvider(JSONProvider):
+    """Flask JSON provider backed by orjson for request parsing and responses."""
 
-# Google Calendar API setup
-SCOPES = ['https://www.googleapis.com/auth/calendar']
+    def dumps(self, obj, **kwargs) -> str:
+        return orjson.dumps(obj).decode()
 
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
 
-def get_calendar_service():
-    """Authenticate and return Google Calendar service."""
-    creds = None
-    if os.path.exists('token.pickle'):
-        with open('token.pickle', 'rb') as token:
-            creds = pickle.load(token)
-    
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            flow = InstalledAppFlow.from_client_secrets_file(
-                'credentials.json', SCOPES)
-            creds = flow.run_local_server(port=0)
-        
-        with open('token.pickle', 'wb') as token:
-            pickle.dump(creds, token)
-    
-    return build('calendar', 'v3', credentials=creds)
+    def response(self, *args, **kwargs):
+        # orjson already produces bytes, so skip the str round-trip
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj), mimetype="application/json")
 
 
-def create_event(summary: str, start_iso: str, end_iso: str, attendees: list[str] | None = None) -> str:
-    """Create a Google Calendar event and return the event link."""
-    service = get_calendar_service()
-    
-    event = {
-        'summary': summary,
-        'start': {
-            'dateTime': start_iso,
-            'timeZone': 'UTC',
-        },
-        'end': {
-            'dateTime': end_iso,
-            'timeZone': 'UTC',
-        },
-    }
-    
-    if attendees:
-        event['attendees'] = [{'email': email} for email in attendees]
-    
-    created_event = service.events().insert(calendarId='primary', body=event).execute()
-    return created_event.get('htmlLink', 'Event created successfully')
+app = Flask(__name__)
+# A stable key keeps session cookies valid across restarts and gunicorn workers;
+# the random fallback is only suitable for a single development process
+app.secret_key = os.getenv("FLASK_SECRET_KEY") or secrets.token_hex(16)
+app.json = ORJSONProvider(app)
+
+# Most recent messages (user + assistant) sent to the model each turn
+MAX_HISTORY_MESSAGES = 40
+
+# Replies to standalone questions, shared by all sessions (and workers, with Redis)
+RESPONSE_CACHE = SemanticResponseCache(redis_url=os.getenv("REDIS_URL"))
 
 
 @function_tool
-def schedule_calendar_event(
+async def schedule_calendar_event(
     title: str,
     start_time: str,
     end_time: str,
     attendees: list[str] | None = None,
 ) -> dict:
     """Schedule a calendar event with the given details."""
-    logger.info(f"Tool Called: schedule_calendar_event")
-    logger.info(f"  Parameters: title={title}, start={start_time}, end={end_time}, attendees={attendees}")
+    logger.info("Tool Called: schedule_calendar_event")
+    logger.info("  Parameters: title=%s, start=%s, end=%s, attendees=%s", title, start_time, end_time, attendees)
     
-    link = create_event(
-        summary=title,
-        start_iso=start_time,
-        end_iso=end_time,
-        attendees=attendees,
+    link = await call_google_api(
+        create_event,
+        build_event_body(title, start_time, end_time, attendees),
     )
+    # Cached answers may describe the calendar before this event existed; the
+    # clear may write to Redis, so keep it off the agent loop
+    await asyncio.to_thread(RESPONSE_CACHE.clear)
     
-    logger.info(f"  Event created successfully: {link}")
+    logger.info("  Event created successfully: %s", link)
     return {"event_link": link}
 
 
 @function_tool
-def list_calendar_meetings(
+async def schedule_calendar_events_batch(events: list[CalendarEventRequest]) -> dict:
+    """Schedule several calendar events at once with a single batch request."""
+    logger.info("Tool Called: schedule_calendar_events_batch")
+    logger.info("  Parameters: %d events", len(events))
+
+    bodies = [
+        build_event_body(e.title, e.start_time, e.end_time, e.attendees)
+        for e in events
+    ]
+    results = await call_google_api(create_events_batch, bodies)
+    await asyncio.to_thread(RESPONSE_CACHE.clear)
+
+    for event, result in zip(events, results):
+        result["title"] = event.title
+
+    failed = sum(1 for result in results if "error" in result)
+    logger.info("  Batch finished: %d created, %d failed", len(results) - failed, failed)
+    return {"count": len(results), "results": results}
+
+
+@function_tool
+async def list_calendar_meetings(
     period: Optional[str] = "current_month",
     start_iso: Optional[str] = None,
     end_iso: Optional[str] = None,
@@ -119,63 +136,17 @@ def list_calendar_meetings(
         if not start_iso and not end_iso:
             if period == "current_month":
                 now = datetime.now(timezone.utc)
-                year = now.year
-                month = now.month
-                first_day = datetime(year, month, 1, 0, 0, 0, tzinfo=timezone.utc)
-                last_day_num = calendar.monthrange(year, month)[1]
-                last_day = datetime(year, month, last_day_num, 23, 59, 59, tzinfo=timezone.utc)
-                start_iso = first_day.isoformat()
-                end_iso = last_day.isoformat()
+                start_iso, end_iso = month_range(now.year, now.month)
             else:
                 raise ValueError("Either provide start_iso/end_iso or use period='current_month'")
 
-        logger.info(f"Listing events from {start_iso} to {end_iso}")
+        logger.info("Listing events from %s to %s", start_iso, end_iso)
 
-        service = get_calendar_service()
+        events_result = await call_google_api(list_events, start_iso, end_iso, max_results)
 
-        events_result = (
-            service.events()
-            .list(
-                calendarId="primary",
-                timeMin=start_iso,
-                timeMax=end_iso,
-                singleEvents=True,
-                orderBy="startTime",
-                maxResults=max_results,
-            )
-            .execute()
-        )
+        events = normalize_events(events_result.get("items", []))
 
-        items = events_result.get("items", [])
-        events: List[dict] = []
-
-        for ev in items:
-            start = ev.get("start", {})
-            end = ev.get("end", {})
-
-            # support both dateTime (timed events) and date (all-day)
-            start_val = start.get("dateTime") or start.get("date")
-            end_val = end.get("dateTime") or end.get("date")
-
-            attendees = []
-            for a in ev.get("attendees", []):
-                attendees.append({
-                    "email": a.get("email"),
-                    "responseStatus": a.get("responseStatus")
-                })
-
-            events.append({
-                "id": ev.get("id"),
-                "summary": ev.get("summary"),
-                "start": start_val,
-                "end": end_val,
-                "attendees": attendees,
-                "htmlLink": ev.get("htmlLink"),
-                "created": ev.get("created"),
-                "updated": ev.get("updated"),
-            })
-
-        logger.info(f"Found {len(events)} events")
+        logger.info("Found %d events", len(events))
         return {"count": len(events), "events": events}
 
     except Exception as e:
@@ -183,21 +154,14 @@ def list_calendar_meetings(
         return {"error": str(e), "count": 0, "events": []}
 
 
-def create_calendar_agent():
-    """Create and return the calendar agent with configured tools and instructions."""
-    # Get current date and time for context
-    current_datetime = datetime.now()
-    current_date_str = current_datetime.strftime("%A, %B %d, %Y")
-    current_time_str = current_datetime.strftime("%I:%M %p")
-    
-    return Agent(
-        name="Calendar Agent",
-        instructions=f"""
+# Static parts of the instructions, joined around the date and time on each run
+_INSTRUCTIONS_PREFIX = """
 You are a scheduling agent.
 
 IMPORTANT CONTEXT:
-- Today is: {current_date_str}
-- Current time is: {current_time_str}
+- Today is: """
+_INSTRUCTIONS_MID = "\n- Current time is: "
+_INSTRUCTIONS_SUFFIX = """
 - Use this information to understand relative dates like "tomorrow", "next week", "today", etc.
 
 Behavior rules:
@@ -211,6 +175,7 @@ Behavior rules:
 - Never create an event until you have:
   title, start_time, end_time (in ISO 8601 format: YYYY-MM-DDTHH:MM:SS) and attendees email addresses (if any)
 - Once ready, call the calendar tool
+- When two or more events are ready to be created, use schedule_calendar_events_batch instead of calling schedule_calendar_event repeatedly
 - You can also list meetings in a time range using list_calendar_meetings
 - When listing meetings, default to current month if no range is specified
 - Confirm the result with the user
@@ -223,21 +188,133 @@ When displaying meeting lists, organize them for better readability:
 - Include key details: title (as link), time range, attendees (if any)
 - Summarize total count at the beginning
 - Use markdown formatting for structure and emphasis
-""",
+"""
+
+
+def calendar_agent_instructions(context, agent) -> str:
+    """Render the agent instructions with the current date and time."""
+    # Get current date and time for context
+    current_datetime = datetime.now()
+    current_date_str = current_datetime.strftime("%A, %B %d, %Y")
+    current_time_str = current_datetime.strftime("%I:%M %p")
+
+    return "".join((_INSTRUCTIONS_PREFIX, current_date_str, _INSTRUCTIONS_MID, current_time_str, _INSTRUCTIONS_SUFFIX))
+
+
+def create_calendar_agent():
+    """Create and return the calendar agent with configured tools and instructions."""
+    # Instructions are rendered per run, so one agent can be reused across turns
+    return Agent(
+        name="Calendar Agent",
+        instructions=calendar_agent_instructions,
         tools=[
             schedule_calendar_event,
+            schedule_calendar_events_batch,
             list_calendar_meetings
         ],
         model="gpt-4o-mini",
+        # Independent tool calls from one response are executed concurrently
+        model_settings=ModelSettings(parallel_tool_calls=True),
     )
 
 
+# Built once per process; the date context is refreshed on every run
+calendar_agent = create_calendar_agent()
+
+# Authenticate in the background at startup (per gunicorn worker, since the
+# app is imported after the fork) so the first tool call finds a warm client
+BLOCKING_EXECUTOR.submit(warm_up)
+
+
+# Dedicated event loop for agent runs, shared by all request threads so the
+# SDK's async HTTP clients are always used from the loop that created them.
+# It is created at import, i.e. inside each gunicorn worker after the fork.
+_AGENT_LOOP = uvloop.new_event_loop() if uvloop else asyncio.new_event_loop()
+_AGENT_LOOP.set_default_executor(BLOCKING_EXECUTOR)
+threading.Thread(target=_AGENT_LOOP.run_forever, name="agent-loop", daemon=True).start()
+
+# Caps concurrent agent runs on the shared loop to respect OpenAI rate limits
+AGENT_RUN_CONCURRENCY = asyncio.Semaphore(8)
+
+
+def run_async(coro):
+    """Run a coroutine on the shared agent loop and wait for its result."""
+    return asyncio.run_coroutine_threadsafe(coro, _AGENT_LOOP).result()
+
+
+async def run_calendar_agent(calendar_agent, messages):
+    """Run the agent on the conversation messages inside a trace."""
+    async with AGENT_RUN_CONCURRENCY:
+        with trace("Calendar Agent Web Execution"):
+            return await Runner.run(
+                starting_agent=calendar_agent,
+                input=messages
+            )
+
+
+async def stream_calendar_agent(calendar_agent, messages, deltas):
+    """Run the agent in streaming mode, pushing text deltas onto a thread-safe queue.
+
+    A ``None`` sentinel is queued once the stream ends, and the final output
+    is returned when the run completes.
+    """
+    try:
+        async with AGENT_RUN_CONCURRENCY:
+            with trace("Calendar Agent Web Execution"):
+                result = Runner.run_streamed(
+                    starting_agent=calendar_agent,
+                    input=messages
+                )
+                try:
+                    async for event in result.stream_events():
+                        # Empty deltas carry nothing for the client, so they are not sent
+                        if (event.type == "raw_response_event" and isinstance(event.data, ResponseTextDeltaEvent)
+                                and event.data.delta):
+                            deltas.put(event.data.delta)
+                finally:
+                    # Stop the underlying run if the client went away mid-stream
+                    if not result.is_complete:
+                        result.cancel()
+    finally:
+        deltas.put(None)
+    return result.final_output
+
+
+async def lookup_cached_response(user_message: str):
+    """Embed a standalone question and return it with the cached reply, if any.
+
+    Returns ``(None, None)`` when embedding fails, so the turn skips the cache.
+    """
+    try:
+        vector = await RESPONSE_CACHE.embed(user_message)
+    except Exception:
+        logger.exception("Embedding failed, skipping the response cache")
+        return None, None
+    # The lookup may read the shared generation from Redis, so keep it off the loop
+    return vector, await asyncio.to_thread(RESPONSE_CACHE.lookup, vector)
+
+
+def sse_event(payload: dict) -> str:
+    """Format a payload as a server-sent event."""
+    return f"data: {orjson.dumps(payload).decode()}\n\n"
+
+
+# Conversation histories live server-side; the cookie only carries a session id
+HISTORY_STORE = create_history_store(MAX_HISTORY_MESSAGES)
+
+
+def get_session_id() -> str:
+    """Return the current session's id, creating one on first use."""
+    if 'sid' not in session:
+        session['sid'] = secrets.token_hex(16)
+    return session['sid']
+
+
 @app.route('/')
 def index():
     """Render the main chat interface."""
-    # Initialize session conversation history
-    if 'conversation_history' not in session:
-        session['conversation_history'] = []
+    # Initialize the session id
+    get_session_id()
     return render_template('index.html')
 
 
@@ -250,38 +327,38 @@ def chat():
     if not user_message:
         return jsonify({'error': 'No message provided'}), 400
     
-    # Get or initialize conversation history
-    if 'conversation_history' not in session:
-        session['conversation_history'] = []
-    
-    conversation_history = session['conversation_history']
-    
-    # Add user message to history
-    conversation_history.append({"role": "user", "content": user_message})
-    
-    # Create context from history
-    context = "\n".join([f"{msg['role']}: {msg['content']}" for msg in conversation_history])
+    sid = get_session_id()
+    user_turn = {"role": "user", "content": user_message}
     
     try:
-        # Create agent and run with tracing
-        logger.info(f"Processing message: {user_message[:50]}...")
-        calendar_agent = create_calendar_agent()
-        
-        with trace("Calendar Agent Web Execution"):
-            result = Runner.run_sync(
-                starting_agent=calendar_agent,
-                input=context
-            )
-        
-        response = result.final_output
-        logger.info(f"Agent response generated: {response[:50]}...")
+        # Get the stored conversation; the turn is only saved once it is answered
+        conversation_history = HISTORY_STORE.get(sid)
+
+        # %.50s truncates only when the record is actually emitted
+        logger.info("Processing message: %.50s...", user_message)
+
+        # Fully specified requests are scheduled directly, without a model round-trip
+        response = run_async(quick_schedule(user_message))
+        if response is not None:
+            RESPONSE_CACHE.clear()
+        else:
+            # Opening questions may reuse the reply to a near-identical earlier one
+            cache_vector = cache_generation = None
+            if not conversation_history and is_cacheable(user_message):
+                cache_generation = RESPONSE_CACHE.current_generation()
+                cache_vector, response = run_async(lookup_cached_response(user_message))
+
+            if response is None:
+                # Run the shared agent with tracing
+                result = run_async(run_calendar_agent(calendar_agent, conversation_history + [user_turn]))
+                response = result.final_output
+                if cache_vector is not None:
+                    RESPONSE_CACHE.store(user_message, cache_vector, response, cache_generation)
         
-        # Add agent response to history
-        conversation_history.append({"role": "assistant", "content": response})
+        logger.info("Agent response generated: %.50s...", response)
         
-        # Save updated history to session
-        session['conversation_history'] = conversation_history
-        session.modified = True
+        # Save the turn; the store keeps only the recent window
+        HISTORY_STORE.extend(sid, [user_turn, {"role": "assistant", "content": response}])
         
         return jsonify({
             'response': response,
@@ -295,11 +372,88 @@ def chat():
         }), 500
 
 
+@app.route('/chat/stream', methods=['POST'])
+def chat_stream():
+    """Handle chat messages from the user, streaming the reply as server-sent events."""
+    data = request.json
+    user_message = data.get('message', '')
+    
+    if not user_message:
+        return jsonify({'error': 'No message provided'}), 400
+    
+    sid = get_session_id()
+    user_turn = {"role": "user", "content": user_message}
+    logger.info("Streaming reply to message: %.50s...", user_message)
+
+    # Failures before the stream starts (e.g. the history store is down) are
+    # reported as a plain JSON error, like /chat
+    try:
+        conversation_history = HISTORY_STORE.get(sid)
+
+        # Fully specified requests are scheduled directly, without a model round-trip
+        quick_reply = run_async(quick_schedule(user_message))
+        if quick_reply is not None:
+            RESPONSE_CACHE.clear()
+        else:
+            # Opening questions may reuse the reply to a near-identical earlier one
+            cache_vector = cache_generation = None
+            if not conversation_history and is_cacheable(user_message):
+                cache_generation = RESPONSE_CACHE.current_generation()
+                cache_vector, quick_reply = run_async(lookup_cached_response(user_message))
+
+        if quick_reply is not None:
+            HISTORY_STORE.extend(sid, [user_turn, {"role": "assistant", "content": quick_reply}])
+            return Response(
+                sse_event({'done': True, 'response': quick_reply, 'success': True}),
+                mimetype='text/event-stream',
+            )
+    except Exception as e:
+        return jsonify({
+            'error': str(e),
+            'success': False
+        }), 500
+
+    def generate():
+        deltas = queue.Queue()
+        future = asyncio.run_coroutine_threadsafe(
+            stream_calendar_agent(calendar_agent, conversation_history + [user_turn], deltas), _AGENT_LOOP
+        )
+        completed = False
+        try:
+            while (delta := deltas.get()) is not None:
+                yield sse_event({'delta': delta})
+            response = future.result()
+            if cache_vector is not None:
+                RESPONSE_CACHE.store(user_message, cache_vector, response, cache_generation)
+
+            # Save the turn; the store keeps only the recent window
+            HISTORY_STORE.extend(sid, [user_turn, {"role": "assistant", "content": response}])
+            completed = True
+            yield sse_event({'done': True, 'response': response, 'success': True})
+        except Exception as e:
+            yield sse_event({'error': str(e), 'success': False})
+        finally:
+            if not completed:
+                # Client disconnected or the run failed: stop the run, nothing was saved
+                future.cancel()
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+
 @app.route('/clear', methods=['POST'])
 def clear_conversation():
     """Clear the conversation history."""
-    session['conversation_history'] = []
-    session.modified = True
+    try:
+        HISTORY_STORE.clear(get_session_id())
+    except Exception as e:
+        return jsonify({
+            'error': str(e),
+            'success': False
+        }), 500
     return jsonify({'success': True})
 
 
@@ -0,0 +1,34 @@
+"""
+Gunicorn settings for the Flask web app (gunicorn -c gunicorn.conf.py flask_app:app).
+
+Threads mostly wait on the per-worker agent event loop and on Google API
+I/O, so gthread workers are enough; extra processes spread the Python-side
+agent orchestration over the available cores. Requests from one browser
+land on any worker, so scaling out needs state every worker agrees on:
+conversation histories in Redis (REDIS_URL) and one cookie signing key
+(FLASK_SECRET_KEY). Without both, a single worker is used.
+"""
+import multiprocessing
+import os
+
+from dotenv import load_dotenv
+
+# The settings below read .env too, not only the app
+load_dotenv()
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:5000")
+worker_class = "gthread"
+
+_shared_state = bool(os.getenv("REDIS_URL") and os.getenv("FLASK_SECRET_KEY"))
+workers = int(os.getenv("GUNICORN_WORKERS") or (multiprocessing.cpu_count() if _shared_state else 1))
+threads = int(os.getenv("GUNICORN_THREADS") or (8 if _shared_state else 16))
+
+
+def on_starting(server):
+    """Warn when several workers would not share sessions and conversations."""
+    if workers > 1 and not _shared_state:
+        server.log.warning(
+            "Running %d workers without both REDIS_URL and FLASK_SECRET_KEY set: "
+            "session cookies and conversations will be lost when requests switch workers",
+            workers,
+        )
@@ -0,0 +1,90 @@
+"""
+Server-side conversation histories for the Flask app.
+
+The session cookie only carries a session id; the messages themselves live
+here. The default in-process store is private to one worker process. Setting
+REDIS_URL keeps histories in Redis instead, so every gunicorn worker (and
+every restart) sees the same conversations.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+import orjson
+
+# Least recently used conversations are dropped beyond this many
+MAX_STORED_CONVERSATIONS = 1000
+
+# Idle conversations expire from Redis after a day
+REDIS_HISTORY_TTL_SECONDS = 24 * 60 * 60
+REDIS_KEY_PREFIX = "calendar-agent:history:"
+
+
+class MemoryHistoryStore:
+    """In-process LRU of conversation histories, shared by the worker's threads."""
+
+    def __init__(self, max_messages: int, max_conversations: int = MAX_STORED_CONVERSATIONS):
+        self.max_messages = max_messages
+        self.max_conversations = max_conversations
+        self._histories: "OrderedDict[str, list]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, sid: str) -> list:
+        """Return a copy of the conversation's messages, oldest first."""
+        with self._lock:
+            history = self._histories.get(sid)
+            if history is None:
+                return []
+            self._histories.move_to_end(sid)
+            return list(history)
+
+    def extend(self, sid: str, messages: list) -> None:
+        """Append messages and keep only the most recent max_messages."""
+        with self._lock:
+            history = self._histories.setdefault(sid, [])
+            history.extend(messages)
+            del history[:-self.max_messages]
+            self._histories.move_to_end(sid)
+            while len(self._histories) > self.max_conversations:
+                self._histories.popitem(last=False)
+
+    def clear(self, sid: str) -> None:
+        """Forget the conversation."""
+        with self._lock:
+            self._histories.pop(sid, None)
+
+
+class RedisHistoryStore:
+    """Conversation histories kept as Redis lists of JSON-encoded messages."""
+
+    def __init__(self, url: str, max_messages: int, ttl_seconds: int = REDIS_HISTORY_TTL_SECONDS):
+        import redis  # only needed when REDIS_URL is configured
+
+        self.max_messages = max_messages
+        self.ttl_seconds = ttl_seconds
+        self._redis = redis.Redis.from_url(url)
+
+    def get(self, sid: str) -> list:
+        """Return the conversation's messages, oldest first."""
+        return [orjson.loads(item) for item in self._redis.lrange(REDIS_KEY_PREFIX + sid, 0, -1)]
+
+    def extend(self, sid: str, messages: list) -> None:
+        """Append messages, keep only the most recent max_messages and refresh the TTL."""
+        key = REDIS_KEY_PREFIX + sid
+        with self._redis.pipeline() as pipe:
+            pipe.rpush(key, *(orjson.dumps(message) for message in messages))
+            pipe.ltrim(key, -self.max_messages, -1)
+            pipe.expire(key, self.ttl_seconds)
+            pipe.execute()
+
+    def clear(self, sid: str) -> None:
+        """Forget the conversation."""
+        self._redis.delete(REDIS_KEY_PREFIX + sid)
+
+
+def create_history_store(max_messages: int):
+    """Return a Redis-backed store when REDIS_URL is set, otherwise an in-process one."""
+    redis_url = os.getenv("REDIS_URL")
+    if redis_url:
+        return RedisHistoryStore(redis_url, max_messages)
+    return MemoryHistoryStore(max_messages)
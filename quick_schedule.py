@@ -0,0 +1,107 @@
+"""
+Fast path for scheduling requests that need no conversation.
+
+Messages such as "Schedule Design review on 2026-01-15 10:00-11:00 UTC" carry
+every field the calendar tool needs, so they are parsed locally and the event
+is created directly instead of spending a model round-trip on them. Anything
+less explicit, including titles that could hide another date, time or
+instruction, falls through to the agent.
+"""
+import logging
+import re
+from datetime import datetime, timezone
+from typing import Optional
+
+from dateutil import parser as date_parser
+
+from calendar_service import build_event_body, call_google_api, create_event
+
+logger = logging.getLogger(__name__)
+
+_TIME = r"\d{1,2}:\d{2}(?:\s*[ap]\.?m\.?)?"
+_EMAIL = r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+"
+
+SCHEDULE_PATTERN = re.compile(
+    rf"""
+    ^\s*(?:please\s+)?(?:schedule|book)\s+
+    (?P<title>.+?)\s+
+    on\s+(?P<date>\d{{4}}-\d{{2}}-\d{{2}})\s+
+    (?:from\s+)?(?P<start>{_TIME})\s*(?:-|–|—|to)\s*(?P<end>{_TIME})\s*
+    (?:UTC|GMT|Z)
+    (?:\s+with\s+(?P<attendees>{_EMAIL}(?:\s*(?:,|and|&)\s*{_EMAIL})*))?
+    \s*[.!]?\s*$
+    """,
+    re.IGNORECASE | re.VERBOSE,
+)
+_ATTENDEE_PATTERN = re.compile(_EMAIL)
+
+# Words that make a title ambiguous ("lunch on Monday", "a reminder to book
+# flights"), so the agent reviews the request instead
+AMBIGUOUS_TITLE_PATTERN = re.compile(
+    r"\b(?:on|at|from|every|until|remind(?:er)?|schedule|book|create|cancel|move|reschedule)\b",
+    re.IGNORECASE,
+)
+
+
+def parse_schedule_request(message: str) -> Optional[dict]:
+    """Extract title, UTC start/end and attendees from an explicit scheduling request.
+
+    Returns None unless the message is unambiguous: a plain title, an ISO
+    date, a start and end time, an explicit UTC marker, an end after the
+    start, and a start that is not in the past.
+    """
+    match = SCHEDULE_PATTERN.match(message)
+    if not match:
+        return None
+
+    title = match.group("title").strip().strip("\"'“”")
+    if not title or AMBIGUOUS_TITLE_PATTERN.search(title):
+        return None
+
+    try:
+        start = date_parser.parse(f"{match.group('date')} {match.group('start')}")
+        end = date_parser.parse(f"{match.group('date')} {match.group('end')}")
+    except (ValueError, OverflowError):
+        return None
+
+    if end <= start or start < datetime.now(timezone.utc).replace(tzinfo=None):
+        return None
+
+    attendees = _ATTENDEE_PATTERN.findall(match.group("attendees") or "")
+    return {
+        "title": title,
+        "start_time": start.isoformat(timespec="seconds"),
+        "end_time": end.isoformat(timespec="seconds"),
+        "attendees": attendees or None,
+    }
+
+
+async def quick_schedule(message: str) -> Optional[str]:
+    """Create the event for an explicit scheduling request and return the reply.
+
+    Returns None only when the message needs the agent. A failed create is
+    reported to the user instead: Google may already have stored the event,
+    and the agent would insert it again under a new id.
+    """
+    details = parse_schedule_request(message)
+    if details is None:
+        return None
+
+    try:
+        link = await call_google_api(
+            create_event,
+            build_event_body(details["title"], details["start_time"], details["end_time"], details["attendees"]),
+        )
+    except Exception as e:
+        logger.exception("Quick scheduling failed")
+        return (
+            f"❌ I couldn't confirm that \"{details['title']}\" was created ({e}). "
+            "Please check your calendar before trying again, as it may already be there."
+        )
+
+    start = datetime.fromisoformat(details["start_time"])
+    end = datetime.fromisoformat(details["end_time"])
+    return (
+        f"✅ Event created: \"{details['title']}\" on {start:%A, %B %d, %Y}, "
+        f"{start:%I:%M %p} – {end:%I:%M %p} UTC.\n{link}"
+    )
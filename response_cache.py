@@ -0,0 +1,174 @@
+"""
+Semantic cache for agent replies to standalone questions.
+
+Opening questions such as "What meetings do I have this week?" tend to be
+asked again in near-identical wording by many sessions. Their embeddings are
+compared against recently answered ones and a close enough match is served
+directly, skipping the model round-trip. Scheduling actions and follow-up
+turns are never cached, and every entry expires after CACHE_TTL_SECONDS so
+answers about the calendar do not drift far from its actual contents.
+
+Creating an event clears the cache. With several gunicorn workers, the
+clear must reach every worker, so when REDIS_URL is configured the cache
+generation lives in Redis and each worker drops its entries once it sees
+the generation change.
+"""
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+from openai import AsyncOpenAI
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MODEL = "text-embedding-3-small"
+SIMILARITY_THRESHOLD = 0.95
+MAX_CACHED_RESPONSES = 256
+CACHE_TTL_SECONDS = 300
+REDIS_GENERATION_KEY = "calendar-agent:response-cache:generation"
+REDIS_TIMEOUT_SECONDS = 0.5
+
+# Only questions about the existing calendar are cached; anything that could
+# make the agent change it must always reach the agent
+QUESTION_PATTERN = re.compile(
+    r"^\s*(?:what|when|which|who|where|how\s+(?:many|much|busy|long)|do\s+i|am\s+i|is\s+there|"
+    r"are\s+there|any|show|list|tell\s+me|give\s+me)\b",
+    re.IGNORECASE,
+)
+
+# Calendar-changing verbs used as a verb: at the start of a clause or after a
+# word that introduces a request ("can you move", "and cancel", "to book"), so
+# nouns such as "my schedule" or "the invite" do not count
+_ACTION_VERB = (
+    r"(?:schedule|book|create|add|put|set(?:\s+up)?|arrange|invite|cancel|delete|remove|"
+    r"move|reschedule|plan|block|organi[sz]e|make)"
+)
+ACTION_PATTERN = re.compile(
+    rf"(?:^|[.!?,;:]|\b(?:please|you|to|and|then|also|me|i|i'?ll|let'?s|we))\s*{_ACTION_VERB}\b",
+    re.IGNORECASE,
+)
+
+
+def is_cacheable(message: str) -> bool:
+    """Return True when a message is a question about the calendar whose reply may be reused."""
+    return bool(QUESTION_PATTERN.match(message)) and not ACTION_PATTERN.search(message)
+
+
+class SemanticResponseCache:
+    """LRU map of normalized message embeddings to agent replies."""
+
+    def __init__(self, max_entries: int = MAX_CACHED_RESPONSES,
+                 threshold: float = SIMILARITY_THRESHOLD,
+                 ttl_seconds: float = CACHE_TTL_SECONDS,
+                 redis_url: Optional[str] = None):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple[np.ndarray, str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped by clear(), so replies computed before a calendar change are not stored
+        self._generation = 0
+        self._client: Optional[AsyncOpenAI] = None
+
+        self._redis = None
+        if redis_url:
+            import redis  # only needed when REDIS_URL is configured
+
+            # Short timeouts, so an unresponsive Redis disables the cache instead
+            # of hanging request threads
+            self._redis = redis.Redis.from_url(
+                redis_url,
+                socket_timeout=REDIS_TIMEOUT_SECONDS,
+                socket_connect_timeout=REDIS_TIMEOUT_SECONDS,
+            )
+
+    def current_generation(self) -> Optional[int]:
+        """Return the cache generation, shared by every worker when Redis is configured.
+
+        Returns None when Redis cannot be reached, which disables the cache.
+        """
+        if self._redis is None:
+            return self._generation
+        try:
+            return int(self._redis.get(REDIS_GENERATION_KEY) or 0)
+        except Exception:
+            logger.exception("Reading the response cache generation failed")
+            return None
+
+    def _sync_generation(self, generation: int) -> None:
+        # Another worker cleared the cache since this one last looked
+        if generation != self._generation:
+            self._entries.clear()
+            self._generation = generation
+
+    async def embed(self, message: str) -> np.ndarray:
+        """Return the unit-length embedding of a message."""
+        # Created lazily so the client binds to the loop that awaits it
+        if self._client is None:
+            self._client = AsyncOpenAI()
+        response = await self._client.embeddings.create(model=EMBEDDING_MODEL, input=message)
+        vector = np.asarray(response.data[0].embedding, dtype=np.float32)
+        return vector / np.linalg.norm(vector)
+
+    def lookup(self, vector: np.ndarray) -> Optional[str]:
+        """Return the cached reply most similar to vector, if above the threshold."""
+        generation = self.current_generation()
+        if generation is None:
+            return None
+
+        with self._lock:
+            self._sync_generation(generation)
+            self._evict_expired()
+            if not self._entries:
+                return None
+
+            keys = list(self._entries)
+            matrix = np.stack([self._entries[key][0] for key in keys])
+            # Vectors are normalized, so the dot product is the cosine similarity
+            similarities = matrix @ vector
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                return None
+
+            self._entries.move_to_end(keys[best])
+            return self._entries[keys[best]][1]
+
+    def store(self, message: str, vector: np.ndarray, response: str, generation: Optional[int]) -> None:
+        """Remember the reply to a message, evicting the least recently used entries.
+
+        The reply is dropped if the cache was cleared since ``generation`` was
+        read from current_generation().
+        """
+        current = self.current_generation()
+        if generation is None or generation != current:
+            return
+
+        with self._lock:
+            self._sync_generation(current)
+            self._entries[message] = (vector, response, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(message)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drop every cached reply, in every worker, e.g. after the calendar changed."""
+        with self._lock:
+            self._entries.clear()
+            if self._redis is None:
+                self._generation += 1
+                return
+
+        try:
+            self._redis.incr(REDIS_GENERATION_KEY)
+        except Exception:
+            # Other workers keep their entries until they expire
+            logger.exception("Clearing the shared response cache failed")
+
+    def _evict_expired(self) -> None:
+        now = time.monotonic()
+        for key in [key for key, entry in self._entries.items() if entry[2] <= now]:
+            del self._entries[key]
@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+import quick_schedule
+from quick_schedule import parse_schedule_request
+
+
+def test_parses_fully_specified_request():
+    details = parse_schedule_request(
+        "Schedule Design review on 2099-01-15 10:00-11:30 UTC with ana@example.com and bo@example.org"
+    )
+
+    assert details == {
+        "title": "Design review",
+        "start_time": "2099-01-15T10:00:00",
+        "end_time": "2099-01-15T11:30:00",
+        "attendees": ["ana@example.com", "bo@example.org"],
+    }
+
+
+def test_parses_twelve_hour_times():
+    details = parse_schedule_request("Book Standup on 2099-01-15 from 9:00 am to 9:15 am UTC.")
+
+    assert details["start_time"] == "2099-01-15T09:00:00"
+    assert details["end_time"] == "2099-01-15T09:15:00"
+    assert details["attendees"] is None
+
+
+@pytest.mark.parametrize("message", [
+    # not explicit enough
+    "Schedule Design review tomorrow 10:00-11:00 UTC",
+    "Schedule Design review on 2099-01-15 10:00-11:00",
+    "Schedule Design review on 2099-01-15 at 10:00",
+    # ambiguous titles are left to the agent
+    "Create a reminder to book flights on 2099-01-15 10:00-11:00 UTC",
+    "Schedule lunch on Monday on 2099-01-15 12:00-13:00 UTC",
+    "Schedule call at noon on 2099-01-15 12:00-13:00 UTC",
+    # invalid ranges
+    "Schedule Design review on 2099-01-15 11:00-10:00 UTC",
+    "Schedule Design review on 2000-01-15 10:00-11:00 UTC",
+    "Schedule Design review on 2099-13-45 10:00-11:00 UTC",
+])
+def test_rejects_requests_that_need_the_agent(message):
+    assert parse_schedule_request(message) is None
+
+
+def test_falls_back_to_the_agent_without_calling_google(monkeypatch):
+    async def fail(*args, **kwargs):
+        raise AssertionError("Google API must not be called")
+
+    monkeypatch.setattr(quick_schedule, "call_google_api", fail)
+
+    assert asyncio.run(quick_schedule.quick_schedule("What's on my calendar today?")) is None
+
+
+def test_creates_event_and_replies_with_link(monkeypatch):
+    async def create(func, event):
+        assert event["summary"] == "Design review"
+        return "https://calendar.google.com/event?eid=abc"
+
+    monkeypatch.setattr(quick_schedule, "call_google_api", create)
+
+    reply = asyncio.run(quick_schedule.quick_schedule("Schedule Design review on 2099-01-15 10:00-11:00 UTC"))
+
+    assert "Design review" in reply
+    assert reply.endswith("https://calendar.google.com/event?eid=abc")
+
+
+def test_reports_google_failure_instead_of_falling_back(monkeypatch):
+    async def fail(*args, **kwargs):
+        raise TimeoutError("timed out")
+
+    monkeypatch.setattr(quick_schedule, "call_google_api", fail)
+
+    reply = asyncio.run(quick_schedule.quick_schedule("Schedule Design review on 2099-01-15 10:00-11:00 UTC"))
+
+    assert reply is not None
+    assert "timed out" in reply
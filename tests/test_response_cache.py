@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from response_cache import SemanticResponseCache, is_cacheable
+
+
+@pytest.mark.parametrize("message", [
+    "What's on my schedule this week?",
+    "What meetings do I have this week?",
+    "Do I have anything booked tomorrow?",
+    "Show my meetings for January",
+    "Are there any invites pending?",
+    "How many meetings do I have today?",
+])
+def test_questions_about_the_calendar_are_cacheable(message):
+    assert is_cacheable(message)
+
+
+@pytest.mark.parametrize("message", [
+    "Put lunch on my calendar at noon",
+    "Schedule a call with Ana",
+    "Can you schedule a call?",
+    "Set a meeting with John tomorrow",
+    "Meeting with John tomorrow 3pm",
+    "Show my meetings and cancel the 3pm",
+    "What meetings do I have? Move the first one to Friday",
+    "When is my next meeting, can you move it to 3pm?",
+])
+def test_requests_that_may_change_the_calendar_are_not_cacheable(message):
+    assert not is_cacheable(message)
+
+
+def unit(*values):
+    vector = np.asarray(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def test_lookup_returns_reply_for_similar_question():
+    cache = SemanticResponseCache()
+    cache.store("q", unit(1, 0), "reply", cache.current_generation())
+
+    assert cache.lookup(unit(1, 0.01)) == "reply"
+    assert cache.lookup(unit(0, 1)) is None
+
+
+def test_clear_drops_entries_and_rejects_replies_computed_before_it():
+    cache = SemanticResponseCache()
+    generation = cache.current_generation()
+    cache.store("q", unit(1, 0), "reply", generation)
+
+    cache.clear()
+    cache.store("q", unit(1, 0), "stale reply", generation)
+
+    assert cache.lookup(unit(1, 0)) is None
+
+
+def test_expired_entries_are_not_served():
+    cache = SemanticResponseCache(ttl_seconds=0)
+    cache.store("q", unit(1, 0), "reply", cache.current_generation())
+
+    assert cache.lookup(unit(1, 0)) is None